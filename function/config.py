@@ -4,7 +4,15 @@ Loads environment variables and provides configuration settings
 """
 
 import os
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Any, Mapping
+
+
+# Configuration attributes that must be set for the function to run
+REQUIRED_FIELDS = ('PROJECT_ID',)
+
+# Accepted values for API_RETRY_JITTER
+RETRY_JITTER_MODES = ('full', 'equal', 'none')
 
 class Config:
     """Configuration class for the data pipeline function"""
@@ -13,6 +21,7 @@ class Config:
     PROJECT_ID: str = os.environ.get('PROJECT_ID', '')
     FIRESTORE_DATABASE: str = os.environ.get('FIRESTORE_DATABASE', '(default)')
     FIRESTORE_COLLECTION: str = os.environ.get('FIRESTORE_COLLECTION', 'api_data')
+    HEALTH_CHECK_INTERVAL: int = int(os.environ.get('HEALTH_CHECK_INTERVAL', '300'))  # seconds between probes
     
     # External API Configuration
     EXTERNAL_API_URL: str = os.environ.get('EXTERNAL_API_URL', 'https://jsonplaceholder.typicode.com')
@@ -22,6 +31,9 @@ class Config:
     API_RETRY_MAX_ATTEMPTS: int = int(os.environ.get('API_RETRY_MAX_ATTEMPTS', '3'))
     API_RETRY_DELAY: int = int(os.environ.get('API_RETRY_DELAY', '2'))
     API_RETRY_BACKOFF: float = 2.0  # Exponential backoff multiplier
+    API_RETRY_JITTER: str = os.environ.get('API_RETRY_JITTER', 'full')  # full, equal or none
+    API_RETRY_MAX_DELAY: float = float(os.environ.get('API_RETRY_MAX_DELAY', '10'))  # longest wait between retries, seconds
+    API_CONGESTION_BASE_DELAY: float = float(os.environ.get('API_CONGESTION_BASE_DELAY', '5'))  # max proactive delay, seconds
     
     # Timeout Configuration
     API_TIMEOUT: int = 30  # seconds
@@ -31,30 +43,45 @@ class Config:
     
     # Data Processing Configuration
     MAX_ITEMS_TO_PROCESS: int = 10  # Limit number of items to process per run
-    BATCH_SIZE: int = 5  # Firestore batch write size
+    BATCH_SIZE: int = int(os.environ.get('BATCH_SIZE', '250'))  # Most writes pending before waiting on a BulkWriter flush
+    FIRESTORE_INITIAL_OPS_PER_SECOND: int = 50  # BulkWriter starting throughput
+    FIRESTORE_MAX_OPS_PER_SECOND: int = 500  # BulkWriter throughput ceiling
+    WORKER_POOL_SIZE: int = int(os.environ.get('WORKER_POOL_SIZE', '8'))  # Shared background worker threads
+    
+    # Read-only snapshot of the settings above, built once after the class body
+    _AS_DICT: Mapping[str, Any] = MappingProxyType({})
     
     @classmethod
     def validate(cls) -> bool:
         """Validate that required configuration is present"""
-        required_fields = ['PROJECT_ID']
-        
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             value = getattr(cls, field, None)
             if not value:
                 raise ValueError(f"Missing required configuration: {field}")
         
+        if cls.API_RETRY_JITTER not in RETRY_JITTER_MODES:
+            raise ValueError(
+                f"Invalid API_RETRY_JITTER: {cls.API_RETRY_JITTER} "
+                f"(expected one of {', '.join(RETRY_JITTER_MODES)})"
+            )
+        
         return True
     
     @classmethod
-    def to_dict(cls) -> Dict[str, Any]:
-        """Convert configuration to dictionary for logging"""
-        return {
-            'project_id': cls.PROJECT_ID,
-            'firestore_database': cls.FIRESTORE_DATABASE,
-            'firestore_collection': cls.FIRESTORE_COLLECTION,
-            'api_url': cls.EXTERNAL_API_URL,
-            'api_endpoint': cls.API_ENDPOINT,
-            'retry_max_attempts': cls.API_RETRY_MAX_ATTEMPTS,
-            'retry_delay': cls.API_RETRY_DELAY,
-            'log_level': cls.LOG_LEVEL,
-        }
\ No newline at end of file
+    def to_dict(cls) -> Mapping[str, Any]:
+        """Return configuration as a read-only mapping for logging"""
+        return cls._AS_DICT
+
+
+Config._AS_DICT = MappingProxyType({
+    'project_id': Config.PROJECT_ID,
+    'firestore_database': Config.FIRESTORE_DATABASE,
+    'firestore_collection': Config.FIRESTORE_COLLECTION,
+    'api_url': Config.EXTERNAL_API_URL,
+    'api_endpoint': Config.API_ENDPOINT,
+    'retry_max_attempts': Config.API_RETRY_MAX_ATTEMPTS,
+    'retry_delay': Config.API_RETRY_DELAY,
+    'retry_jitter': Config.API_RETRY_JITTER,
+    'retry_max_delay': Config.API_RETRY_MAX_DELAY,
+    'log_level': Config.LOG_LEVEL,
+})
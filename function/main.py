@@ -3,19 +3,27 @@ Cloud Function for Data Pipeline
 Fetches data from JSONPlaceholder API, processes it, and stores in Firestore
 """
 
+import atexit
 import logging
 import sys
-from datetime import datetime
-from typing import Dict, Any, List
-import requests
+import threading
+import time
+import uuid
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+import httpx
+import orjson
 from google.cloud import firestore
 from google.cloud import logging as cloud_logging
 
 from config import Config
 from utils import (
+    BulkWriteResult,
+    CongestionController,
     retry_with_backoff,
-    validate_post_data,
-    transform_post_data,
+    validate_and_transform_post,
     check_firestore_health,
     handle_rate_limit,
     batch_write_to_firestore,
@@ -31,19 +39,48 @@ logging_client.setup_logging()
 logger = logging.getLogger(__name__)
 logger.setLevel(getattr(logging, Config.LOG_LEVEL))
 
+# Worker pool shared by all invocations of this instance; threads start lazily and are reused
+executor = ThreadPoolExecutor(max_workers=Config.WORKER_POOL_SIZE, thread_name_prefix='pipeline')
+atexit.register(executor.shutdown)
+
+# Firestore client reused across warm invocations, created lazily on first use
+firestore_client: Optional[firestore.Client] = None
+firestore_client_lock = threading.Lock()
+
+# Monotonic time of the last successful Firestore health check in this instance
+last_health_check_at: Optional[float] = None
+
+# Configuration never changes within an instance, so log it once at cold start
+logger.info("Configuration: %s", dict(Config.to_dict()))
+
+
+def _create_http_client() -> httpx.Client:
+    # HTTP/2 multiplexes concurrent requests over one connection; retries are
+    # handled by retry_with_backoff, so the client only pools connections
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        timeout=Config.API_TIMEOUT,
+        follow_redirects=True,
+        headers={'User-Agent': 'GCP-Cloud-Function-Data-Pipeline/1.0'}
+    )
+
+
+# Shared HTTP client, created once per instance so warm invocations reuse open connections
+http_client = _create_http_client()
+
+# Tracks 429s from the external API across warm invocations of this instance
+api_congestion = CongestionController(base_delay=Config.API_CONGESTION_BASE_DELAY)
+
 
 def fetch_data_from_api() -> List[Dict[str, Any]]:
     url = f"{Config.EXTERNAL_API_URL}{Config.API_ENDPOINT}"
-    logger.info(f"Fetching data from: {url}")
+    logger.info("Fetching data from: %s", url)
     
     def make_request():
-        response = requests.get(
-            url,
-            timeout=Config.API_TIMEOUT,
-            headers={'User-Agent': 'GCP-Cloud-Function-Data-Pipeline/1.0'}
-        )
+        response = http_client.get(url)
         handle_rate_limit(response)
-        return response.json()
+        return orjson.loads(response.content)
     
     # Fetch with retry logic
     data = retry_with_backoff(
@@ -51,131 +88,177 @@ def fetch_data_from_api() -> List[Dict[str, Any]]:
         max_attempts=Config.API_RETRY_MAX_ATTEMPTS,
         initial_delay=Config.API_RETRY_DELAY,
         backoff_factor=Config.API_RETRY_BACKOFF,
-        exceptions=(requests.RequestException, Exception)
+        exceptions=(httpx.HTTPError, Exception),
+        jitter=Config.API_RETRY_JITTER,
+        congestion=api_congestion,
+        max_delay=Config.API_RETRY_MAX_DELAY
     )
     
-    logger.info(f"Successfully fetched {len(data)} items from API")
+    logger.info("Successfully fetched %d items from API", len(data))
     return data
 
 
-def process_data(raw_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    processed_items = []
-    errors = []
+def process_data(
+    raw_data: Iterable[Dict[str, Any]],
+    errors: Optional[List[str]] = None
+) -> Iterator[Dict[str, Any]]:
+    # Yields items as they are transformed so they can be written without building a list;
+    # validation and processing failures are appended to errors as they happen
+    if errors is None:
+        errors = []
+    first_error = len(errors)
+    processed_count = 0
+    
+    # Limit number of items to process without copying the input
+    items_to_process = islice(raw_data, Config.MAX_ITEMS_TO_PROCESS)
+    logger.info("Processing up to %d items", Config.MAX_ITEMS_TO_PROCESS)
     
-    # Limit number of items to process
-    items_to_process = raw_data[:Config.MAX_ITEMS_TO_PROCESS]
-    logger.info(f"Processing {len(items_to_process)} items")
+    # All items in a run share one processing timestamp
+    processed_at = datetime.now(timezone.utc).isoformat()
+    
+    # Bind hot lookups to locals once, outside the loop
+    transform = validate_and_transform_post
+    add_error = errors.append
+    warn = logger.warning
+    debug = logger.debug
     
     for idx, item in enumerate(items_to_process, 1):
         try:
-            # Validate data
-            if not validate_post_data(item):
-                errors.append(f"Item {idx}: Validation failed")
-                logger.warning(f"Skipping item {idx}: validation failed")
+            # Validate and transform data
+            transformed = transform(item, processed_at)
+            if transformed is None:
+                add_error(f"Item {idx}: Validation failed")
+                warn("Skipping item %d: validation failed", idx)
                 continue
             
-            # Transform data
-            transformed = transform_post_data(item)
-            processed_items.append(transformed)
-            logger.debug(f"Item {idx}: Processed successfully")
-            
         except Exception as e:
             error_msg = f"Item {idx}: Processing error - {str(e)}"
-            errors.append(error_msg)
+            add_error(error_msg)
             logger.error(error_msg)
+            continue
+        
+        processed_count += 1
+        debug("Item %d: Processed successfully", idx)
+        yield transformed
     
-    logger.info(f"Processed {len(processed_items)} items successfully, {len(errors)} errors")
-    
-    if errors:
-        logger.warning(f"Processing errors: {errors}")
+    processing_errors = errors[first_error:]
+    logger.info("Processed %d items successfully, %d errors", processed_count, len(processing_errors))
     
-    return processed_items
+    if processing_errors:
+        logger.warning("Processing errors: %s", processing_errors)
 
 
-def store_data_in_firestore(db: firestore.Client, items: List[Dict[str, Any]]) -> int:
-    if not items:
-        logger.warning("No items to store in Firestore")
-        return 0
-    
-    logger.info(f"Storing {len(items)} items in Firestore collection: {Config.FIRESTORE_COLLECTION}")
+def store_data_in_firestore(
+    db: firestore.Client,
+    items: Iterable[Dict[str, Any]],
+    errors: Optional[List[str]] = None
+) -> BulkWriteResult:
+    logger.info("Storing items in Firestore collection: %s", Config.FIRESTORE_COLLECTION)
     
     try:
-        # Batch write to Firestore
-        stored_count = batch_write_to_firestore(
+        # Items are written as they arrive, so processing and writes overlap
+        result = batch_write_to_firestore(
             db=db,
             collection_name=Config.FIRESTORE_COLLECTION,
             items=items,
-            batch_size=Config.BATCH_SIZE
+            batch_size=Config.BATCH_SIZE,
+            initial_ops_per_second=Config.FIRESTORE_INITIAL_OPS_PER_SECOND,
+            max_ops_per_second=Config.FIRESTORE_MAX_OPS_PER_SECOND,
+            errors=errors
         )
         
-        logger.info(f"Successfully stored {stored_count} items in Firestore")
-        return stored_count
+        if result.written == 0:
+            logger.warning("No items stored in Firestore")
+        else:
+            logger.info("Successfully stored %d of %d items in Firestore", result.written, result.submitted)
+        return result
         
     except Exception as e:
-        logger.error(f"Failed to store data in Firestore: {str(e)}")
+        logger.error("Failed to store data in Firestore: %s", e)
         raise
 
 
+def get_firestore_client() -> firestore.Client:
+    global firestore_client
+    
+    if firestore_client is None:
+        with firestore_client_lock:
+            if firestore_client is None:
+                logger.info("Initializing Firestore client for project: %s", Config.PROJECT_ID)
+                firestore_client = firestore.Client(
+                    project=Config.PROJECT_ID,
+                    database=Config.FIRESTORE_DATABASE
+                )
+    
+    return firestore_client
+
+
 def initialize_firestore() -> firestore.Client:
+    global last_health_check_at
+    
     try:
-        logger.info(f"Initializing Firestore client for project: {Config.PROJECT_ID}")
-        db = firestore.Client(
-            project=Config.PROJECT_ID,
-            database=Config.FIRESTORE_DATABASE
-        )
+        db = get_firestore_client()
         
-        # Perform health check
-        if not check_firestore_health(db):
-            raise Exception("Firestore health check failed")
+        # Only probe Firestore when the cached health check result has expired
+        now = time.monotonic()
+        if last_health_check_at is None or now - last_health_check_at > Config.HEALTH_CHECK_INTERVAL:
+            if not check_firestore_health(db):
+                last_health_check_at = None
+                raise Exception("Firestore health check failed")
+            last_health_check_at = now
         
-        logger.info("Firestore client initialized successfully")
+        logger.info("Firestore client ready")
         return db
         
     except Exception as e:
-        logger.error(f"Failed to initialize Firestore: {str(e)}")
+        logger.error("Failed to initialize Firestore: %s", e)
         raise
 
 
 def main(request) -> tuple:
-    start_time = datetime.utcnow()
+    start_time = datetime.now(timezone.utc)
+    start = time.monotonic()
     errors = []
     
     try:
         # Log function invocation
-        logger.info("=" * 80)
-        logger.info("Cloud Function execution started")
-        logger.info(f"Configuration: {Config.to_dict()}")
+        execution_id = request.headers.get('Function-Execution-Id') or uuid.uuid4().hex
+        logger.debug("=" * 80)
+        logger.info("Cloud Function execution started: %s", execution_id)
         
         # Validate configuration
         Config.validate()
         
-        # Initialize Firestore
-        db = initialize_firestore()
+        # Initialize Firestore in the background while the API fetch is in flight
+        db_future = executor.submit(initialize_firestore)
         
         # Step 1: Fetch data from API
         logger.info("Step 1: Fetching data from external API")
         raw_data = fetch_data_from_api()
         
-        # Step 2: Process data
-        logger.info("Step 2: Processing and validating data")
-        processed_data = process_data(raw_data)
-        
-        # Step 3: Store data in Firestore
-        logger.info("Step 3: Storing data in Firestore")
-        stored_count = store_data_in_firestore(db, processed_data)
+        if not raw_data:
+            logger.warning("No data returned from API, skipping processing and storage")
+            result = BulkWriteResult(submitted=0, written=0)
+        else:
+            db = db_future.result()
+            
+            # Steps 2-3: Process data and stream it straight into Firestore
+            logger.info("Steps 2-3: Processing data and storing it in Firestore")
+            result = store_data_in_firestore(db, process_data(raw_data, errors), errors)
         
         # Generate execution summary
         summary = get_execution_summary(
             total_fetched=len(raw_data),
-            total_processed=len(processed_data),
-            total_stored=stored_count,
+            total_processed=result.submitted,
+            total_stored=result.written,
             errors=errors,
-            start_time=start_time
+            start_time=start_time,
+            duration=time.monotonic() - start
         )
         
-        logger.info("Cloud Function execution completed successfully")
-        logger.info(f"Execution summary: {summary}")
-        logger.info("=" * 80)
+        logger.info("Cloud Function execution completed successfully: %s", execution_id)
+        logger.info("Execution summary: %s", summary)
+        logger.debug("=" * 80)
         
         return (summary, 200)
         
@@ -186,11 +269,11 @@ def main(request) -> tuple:
         summary = {
             'status': 'failed',
             'error': str(e),
-            'execution_time': (datetime.utcnow() - start_time).total_seconds(),
-            'timestamp': datetime.utcnow().isoformat()
+            'execution_time': time.monotonic() - start,
+            'timestamp': datetime.now(timezone.utc).isoformat()
         }
         
-        logger.info("=" * 80)
+        logger.debug("=" * 80)
         return (summary, 500)
 
 
@@ -198,13 +281,13 @@ def main(request) -> tuple:
 def health_check(request) -> tuple:
     try:
         # Check Firestore connection
-        db = initialize_firestore()
+        db = get_firestore_client()
         firestore_healthy = check_firestore_health(db)
         
         health_status = {
             'status': 'healthy' if firestore_healthy else 'unhealthy',
             'firestore': 'connected' if firestore_healthy else 'disconnected',
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
             'version': '1.0.0'
         }
         
@@ -212,5 +295,5 @@ def health_check(request) -> tuple:
         return (health_status, status_code)
         
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         return ({'status': 'unhealthy', 'error': str(e)}, 503)
\ No newline at end of file
@@ -3,93 +3,196 @@ Utility functions for the data pipeline
 Includes retry logic, data validation, and health checks
 """
 
+import math
 import time
+import random
+import threading
+import zlib
 import logging
-from typing import Any, Dict, List, Optional, Callable
-from datetime import datetime
-import requests
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Callable
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import httpx
 from google.cloud import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriteFailure, BulkWriter, BulkWriterOptions
+from google.rpc import code_pb2
 
 
 logger = logging.getLogger(__name__)
 
+# Required post fields and their expected types, checked in order
+POST_SCHEMA = (
+    ('userId', int),
+    ('id', int),
+    ('title', str),
+    ('body', str),
+)
+
+_MISSING = object()
+
+# gRPC status codes worth retrying for a single document write
+RETRYABLE_WRITE_CODES = frozenset({
+    code_pb2.ABORTED,
+    code_pb2.DEADLINE_EXCEEDED,
+    code_pb2.RESOURCE_EXHAUSTED,
+    code_pb2.UNAVAILABLE,
+})
+
+
+class RateLimitError(httpx.HTTPError):
+    """Raised on HTTP 429, carrying the server-requested delay in seconds if one was given"""
+    
+    def __init__(
+        self,
+        message: str,
+        retry_after: Optional[float] = None,
+        response: Optional[httpx.Response] = None
+    ):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.response = response
+
+
+class CongestionController:
+    """Client-side adaptive throttle driven by how often recent requests hit HTTP 429"""
+    
+    def __init__(
+        self,
+        base_delay: float = 5.0,
+        increase_factor: float = 2.0,
+        increase_step: float = 0.2,
+        decrease_step: float = 0.05
+    ):
+        self.base_delay = base_delay
+        self.increase_factor = increase_factor
+        self.increase_step = increase_step
+        self.decrease_step = decrease_step
+        self.throttle_rate = 0.0  # Smoothed share of recent requests that were throttled, 0..1
+        self._lock = threading.Lock()
+    
+    def delay(self) -> float:
+        return self.base_delay * self.throttle_rate
+    
+    def wait(self) -> None:
+        # Back off proactively in proportion to recent congestion, with equal jitter
+        delay = self.delay()
+        if delay > 0:
+            sleep_for = delay / 2 + random.uniform(0, delay / 2)
+            logger.info("Congestion throttle: waiting %.2f seconds before request", sleep_for)
+            time.sleep(sleep_for)
+    
+    def record_throttled(self) -> None:
+        # Multiplicative increase on 429
+        with self._lock:
+            self.throttle_rate = min(1.0, self.throttle_rate * self.increase_factor + self.increase_step)
+    
+    def record_success(self) -> None:
+        # Additive decrease on success
+        with self._lock:
+            self.throttle_rate = max(0.0, self.throttle_rate - self.decrease_step)
+
 
 def retry_with_backoff(
     func: Callable,
     max_attempts: int = 3,
     initial_delay: int = 2,
     backoff_factor: float = 2.0,
-    exceptions: tuple = (Exception,)
+    exceptions: tuple = (Exception,),
+    jitter: str = "full",
+    congestion: Optional[CongestionController] = None,
+    max_delay: Optional[float] = None
 ) -> Any:
+    if jitter not in ('full', 'equal', 'none'):
+        raise ValueError(f"Unknown jitter mode: {jitter}")
+    
     delay = initial_delay
     last_exception = None
+    throttled = False
     
     for attempt in range(1, max_attempts + 1):
         try:
-            logger.info(f"Attempt {attempt}/{max_attempts}")
+            logger.info("Attempt %d/%d", attempt, max_attempts)
+            # After a 429 the backoff sleep already honored Retry-After, so don't
+            # wait again for the same congestion
+            if congestion is not None and not throttled:
+                congestion.wait()
             result = func()
-            logger.info(f"Success on attempt {attempt}")
+            logger.info("Success on attempt %d", attempt)
+            if congestion is not None:
+                congestion.record_success()
             return result
             
         except exceptions as e:
             last_exception = e
-            logger.warning(f"Attempt {attempt} failed: {str(e)}")
+            throttled = isinstance(e, RateLimitError)
+            if congestion is not None and throttled:
+                congestion.record_throttled()
+            logger.warning("Attempt %d failed: %s", attempt, e)
             
             if attempt < max_attempts:
-                logger.info(f"Retrying in {delay} seconds...")
-                time.sleep(delay)
+                # Randomize the wait so concurrent instances don't retry in lockstep
+                if jitter == 'full':
+                    sleep_for = random.uniform(0, delay)
+                elif jitter == 'equal':
+                    sleep_for = delay / 2 + random.uniform(0, delay / 2)
+                else:
+                    sleep_for = delay
+                
+                # Never retry sooner than the server asked us to
+                if isinstance(e, RateLimitError) and e.retry_after is not None:
+                    sleep_for = max(sleep_for, e.retry_after)
+                
+                # Keep every wait within max_delay so retries finish inside the function timeout
+                if max_delay is not None and sleep_for > max_delay:
+                    logger.warning("Capping retry delay of %.2f seconds at %.2f seconds", sleep_for, max_delay)
+                    sleep_for = max_delay
+                
+                logger.info("Retrying in %.2f seconds...", sleep_for)
+                time.sleep(sleep_for)
                 delay *= backoff_factor
             else:
-                logger.error(f"All {max_attempts} attempts failed")
+                logger.error("All %d attempts failed", max_attempts)
     
     raise last_exception
 
 
-def validate_post_data(data: Dict[str, Any]) -> bool:
-    required_fields = ['userId', 'id', 'title', 'body']
+def validate_and_transform_post(
+    data: Dict[str, Any],
+    processed_at: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    # Validate and transform in one pass so each string is stripped only once
+    for field, expected_type in POST_SCHEMA:
+        value = data.get(field, _MISSING)
+        if value is _MISSING:
+            logger.warning("Missing required field: %s", field)
+            return None
+        if not isinstance(value, expected_type):
+            logger.warning("Invalid %s type: %s", field, type(value))
+            return None
     
-    # Check if all required fields exist
-    for field in required_fields:
-        if field not in data:
-            logger.warning(f"Missing required field: {field}")
-            return False
-    
-    # Validate field types
-    if not isinstance(data.get('userId'), int):
-        logger.warning(f"Invalid userId type: {type(data.get('userId'))}")
-        return False
+    title = data['title'].strip()
+    if not title:
+        logger.warning("Invalid or empty title")
+        return None
     
-    if not isinstance(data.get('id'), int):
-        logger.warning(f"Invalid id type: {type(data.get('id'))}")
-        return False
+    body = data['body'].strip()
+    if not body:
+        logger.warning("Invalid or empty body")
+        return None
     
-    if not isinstance(data.get('title'), str) or not data.get('title').strip():
-        logger.warning(f"Invalid or empty title")
-        return False
-    
-    if not isinstance(data.get('body'), str) or not data.get('body').strip():
-        logger.warning(f"Invalid or empty body")
-        return False
-    
-    return True
-
-
-def transform_post_data(data: Dict[str, Any]) -> Dict[str, Any]:
-    transformed = {
+    return {
         'user_id': data['userId'],
         'post_id': data['id'],
-        'title': data['title'].strip(),
-        'body': data['body'].strip(),
-        'title_length': len(data['title'].strip()),
-        'body_length': len(data['body'].strip()),
-        'word_count': len(data['body'].strip().split()),
+        'title': title,
+        'body': body,
+        'title_length': len(title),
+        'body_length': len(body),
+        'word_count': len(body.split()),
         'fetched_at': firestore.SERVER_TIMESTAMP,
-        'processed_at': datetime.utcnow().isoformat(),
+        'processed_at': processed_at or datetime.now(timezone.utc).isoformat(),
         'source': 'jsonplaceholder',
         'status': 'processed'
     }
-    
-    return transformed
 
 
 def check_firestore_health(db: firestore.Client) -> bool:
@@ -111,45 +214,128 @@ def check_firestore_health(db: firestore.Client) -> bool:
             return False
             
     except Exception as e:
-        logger.error(f"Firestore health check failed: {str(e)}")
+        logger.error("Firestore health check failed: %s", e)
         return False
 
 
-def handle_rate_limit(response: requests.Response) -> None:
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Returns None when the header is missing or unusable so callers keep their own schedule
+    if not value:
+        return None
+    
+    # Retry-After is either a number of seconds or an HTTP date
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        if not math.isfinite(seconds):
+            logger.warning("Non-finite Retry-After header: %s", value)
+            return None
+        return max(seconds, 0.0)
+    
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.warning("Unparseable Retry-After header: %s", value)
+        return None
+    
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def handle_rate_limit(response: httpx.Response) -> None:
     if response.status_code == 429:
-        retry_after = response.headers.get('Retry-After', '60')
-        logger.warning(f"Rate limited. Retry after {retry_after} seconds")
-        raise Exception(f"Rate limited. Retry after {retry_after} seconds")
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is None:
+            message = "Rate limited"
+        else:
+            message = f"Rate limited. Retry after {retry_after} seconds"
+        logger.warning(message)
+        raise RateLimitError(message, retry_after=retry_after, response=response)
     
     response.raise_for_status()
 
 
+class BulkWriteResult(NamedTuple):
+    """Counts reported by batch_write_to_firestore"""
+    
+    submitted: int  # Items consumed from the input and queued for writing
+    written: int  # Items Firestore confirmed as written
+
+
+def post_document_id(post_id: int) -> str:
+    # A stable 1-byte hash prefix spreads sequential post IDs across the keyspace
+    # so writes don't hot-spot a single Firestore tablet
+    shard = zlib.crc32(str(post_id).encode()) & 0xff
+    return f"{shard:02x}_post_{post_id}"
+
+
 def batch_write_to_firestore(
     db: firestore.Client,
     collection_name: str,
-    items: List[Dict[str, Any]],
-    batch_size: int = 5
-) -> int:
-    total_written = 0
-    
-    for i in range(0, len(items), batch_size):
-        batch = db.batch()
-        batch_items = items[i:i + batch_size]
-        
-        for item in batch_items:
-            doc_id = f"post_{item['post_id']}"
-            doc_ref = db.collection(collection_name).document(doc_id)
-            batch.set(doc_ref, item)
-        
-        try:
-            batch.commit()
-            total_written += len(batch_items)
-            logger.info(f"Batch write successful: {len(batch_items)} items")
-        except Exception as e:
-            logger.error(f"Batch write failed: {str(e)}")
-            raise
+    items: Iterable[Dict[str, Any]],
+    batch_size: int = 500,
+    initial_ops_per_second: int = 50,
+    max_ops_per_second: int = 500,
+    max_attempts: int = 5,
+    errors: Optional[List[str]] = None
+) -> BulkWriteResult:
+    collection = db.collection(collection_name)
+    written = []
+    failures = []
+    
+    def on_write_result(reference, result, bulk_writer: BulkWriter) -> None:
+        written.append(reference.id)
+    
+    def on_write_error(error: BulkWriteFailure, bulk_writer: BulkWriter) -> bool:
+        # Returning True asks the BulkWriter to retry the write with backoff
+        if error.code in RETRYABLE_WRITE_CODES and error.attempts < max_attempts:
+            return True
+        failures.append(f"{error.operation.reference.id}: {error.message}")
+        return False
+    
+    # BulkWriter pipelines writes and ramps throughput up to max_ops_per_second
+    writer = db.bulk_writer(
+        options=BulkWriterOptions(
+            initial_ops_per_second=initial_ops_per_second,
+            max_ops_per_second=max_ops_per_second
+        )
+    )
+    writer.on_write_result(on_write_result)
+    writer.on_write_error(on_write_error)
+    
+    document = collection.document
+    write = writer.set
+    
+    # Writes are queued and sent in the background; batch_size only bounds how many
+    # may be pending before we wait for them, so small runs are flushed once on close
+    pending = 0
+    submitted = 0
+    
+    try:
+        for item in items:
+            doc_id = post_document_id(item['post_id'])
+            write(document(doc_id), item)
+            pending += 1
+            submitted += 1
+            
+            if pending >= batch_size:
+                writer.flush()
+                pending = 0
+    finally:
+        # close() flushes whatever is still queued and stops the writer
+        writer.close()
+    
+    logger.info("Bulk write finished: %d written, %d failed", len(written), len(failures))
+    
+    if failures:
+        logger.error("Failed Firestore writes: %s", failures)
+        if errors is not None:
+            errors.extend(f"Write failed for {failure}" for failure in failures)
     
-    return total_written
+    return BulkWriteResult(submitted=submitted, written=len(written))
 
 
 def get_execution_summary(
@@ -157,10 +343,11 @@ def get_execution_summary(
     total_processed: int,
     total_stored: int,
     errors: List[str],
-    start_time: datetime
+    start_time: datetime,
+    duration: float
 ) -> Dict[str, Any]:
-    end_time = datetime.utcnow()
-    duration = (end_time - start_time).total_seconds()
+    # duration comes from a monotonic clock; wall-clock times are only for reporting
+    end_time = start_time + timedelta(seconds=duration)
     
     return {
         'execution_time': duration,